@@ -31,6 +31,15 @@ def test_getting_invoice_data():
         assert invoice.adk_sup_inv_head_supplier_name == "Created for test"
         assert str(invoice.adk_sup_inv_head_invoice_date) == "2021-03-02 00:00:00"
 
+def test_snapshot_of_invoice():
+    with Visma.get_company_api("FTG10") as api:
+        invoice = api.supplier_invoice_head.get(adk_sup_inv_head_invoice_number="41cb6edd-2-test")
+        values = invoice.snapshot(["adk_sup_inv_head_invoice_number", "adk_sup_inv_head_supplier_name"])
+        assert values == {
+            "adk_sup_inv_head_invoice_number": "41cb6edd-2-test",
+            "adk_sup_inv_head_supplier_name": "Created for test",
+        }
+
 def test_create_rows_for_invoice():
     with Visma.get_company_api("FTG10") as api:
         invoice = api.supplier_invoice_head.get(adk_sup_inv_head_invoice_number="41cb6edd-2-test")
@@ -54,6 +63,13 @@ def test_create_rows_for_invoice():
         assert "5010" in account_numbers
         assert "8012" in account_numbers
 
+def test_iter_rows_yields_same_rows_as_rows():
+    with Visma.get_company_api("FTG10") as api:
+        invoice = api.supplier_invoice_head.get(adk_sup_inv_head_invoice_number="41cb6edd-2-test")
+
+        account_numbers = [row.adk_ooi_row_account_number for row in invoice.rows()]
+        assert [row.adk_ooi_row_account_number for row in invoice.iter_rows()] == account_numbers
+
 def test_deleting_random_rows_keeps_other_data_intact():
     with Visma.get_company_api("FTG10") as api:
         invoice = api.supplier_invoice_head.get(adk_sup_inv_head_invoice_number="41cb6edd-2-test")
@@ -0,0 +1,107 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import visma_administration.api as api_module
+from visma_administration.api import Visma
+
+
+class StubApi:
+    """
+    Stands in for the Api class of the DLL, recording which companies are opened and closed
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def AdkOpen2(self, common_path, company_path, username, password):
+        self.calls.append(("open", company_path))
+        return SimpleNamespace(lRc=0)
+
+    def AdkClose(self):
+        self.calls.append(("close",))
+
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    stub = StubApi()
+    monkeypatch.setattr(api_module, "_API", stub)
+    monkeypatch.setattr(api_module, "_ADKE_OK", 0)
+    monkeypatch.setattr(Visma, "companies", {})
+    monkeypatch.setattr(Visma, "_instances", {})
+    monkeypatch.setattr(Visma, "active_sessions", 0)
+    monkeypatch.setattr(Visma, "_active_company", None)
+    monkeypatch.setattr(Visma, "_opened_company", None)
+    for name in ("A", "B"):
+        Visma.add_company(
+            name=name, common_path="common", company_path=name, username="user", password="password"
+        )
+    return stub
+
+
+def test_nested_sessions_on_the_same_company(stub_api):
+    with Visma.get_company_api("A") as outer:
+        outer.api
+        with Visma.get_company_api("A") as inner:
+            assert inner is outer
+            inner.api
+        assert Visma.active_sessions == 1
+
+    assert Visma.active_sessions == 0
+    assert stub_api.calls == [("open", "A")]
+
+
+def test_sessions_on_the_same_company_do_not_wait(stub_api):
+    entered = threading.Event()
+
+    def use_a():
+        with Visma.get_company_api("A") as api:
+            api.api
+            entered.set()
+
+    with Visma.get_company_api("A") as api:
+        api.api
+        thread = threading.Thread(target=use_a)
+        thread.start()
+        assert entered.wait(5)
+        thread.join(5)
+
+    assert stub_api.calls == [("open", "A")]
+
+
+def test_sessions_on_different_companies_wait_for_each_other(stub_api):
+    events = []
+    a_entered = threading.Event()
+    release_a = threading.Event()
+
+    def use_a():
+        with Visma.get_company_api("A") as api:
+            api.api
+            events.append("enter A")
+            a_entered.set()
+            release_a.wait(5)
+            events.append("exit A")
+
+    def use_b():
+        a_entered.wait(5)
+        with Visma.get_company_api("B") as api:
+            api.api
+            events.append("enter B")
+
+    threads = [threading.Thread(target=use_a), threading.Thread(target=use_b)]
+    for thread in threads:
+        thread.start()
+
+    assert a_entered.wait(5)
+    # Gives the thread using B time to start waiting for A to be released
+    time.sleep(0.2)
+    assert events == ["enter A"]
+
+    release_a.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert events == ["enter A", "exit A", "enter B"]
+    assert stub_api.calls == [("open", "A"), ("close",), ("open", "B")]
@@ -1,13 +1,13 @@
 ﻿import datetime
 import logging
 import os
-import time
+import threading
 import warnings
-from collections import namedtuple
+import weakref
+from collections import deque, namedtuple
 from contextlib import contextmanager
 from decimal import Decimal
 from os import sys
-from winreg import HKEY_LOCAL_MACHINE, OpenKey, QueryValueEx
 
 from .exceptions import (
     CompanyNotFoundError,
@@ -21,25 +21,139 @@ IS_64_BIT = sys.maxsize > 2 ** 32
 REG_PATH = "SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\App Paths\\SpcsAdm.Exe"
 DLL_NAME_64_BIT = "AdkNet6Wrapper.dll" # NET 6 wrapper is 64 bit
 DLL_NAME_32_BIT = "AdkNet4Wrapper.dll"
-if IS_64_BIT:
-    from pythonnet import load
-    load("coreclr")
 
-import clr
-from System import Boolean, DateTime, Double, String, Int32
+Credentials = namedtuple("Credentials", ["username", "password"])
 
-with OpenKey(HKEY_LOCAL_MACHINE, REG_PATH) as key:
-    dll_location = QueryValueEx(key, "AdkDll")[0]
+# Everything below is set by _load_api() once the DLL is loaded. So are the System
+# types Boolean, DateTime, Double, Int32 and String, which are left undefined until
+# then so the module __getattr__ can load them on first access
+_API = None
 
+_E_CHAR = _E_DOUBLE = _E_BOOL = _E_DATE = _E_UNUSED = None
+_ADKE_OK = _ERR_ELRC = None
 
-dll_name = DLL_NAME_64_BIT if IS_64_BIT else DLL_NAME_32_BIT
-path = os.path.join(dll_location, dll_name)
-clr.AddReference(path)
+# Maps field types to the Python types that may be assigned to them
+_TYPE_TO_PYTYPE = {}
+# Maps field types to the (getter, setter) pair used to access them
+_ACCESSORS = {}
+# ADK_DB_ names defined on the Api class, and every ADK_ name. The latter
+# is used to reject unknown fields without asking the CLR
+_DB_FIELDS = ()
+_FIELD_NAMES = frozenset()
+
+# Out parameters for the AdkGet* functions, the value read is returned
+# in a new object so these can be shared between calls
+_EMPTY_STR = _ZERO_D = _FALSE = _ZERO_DATE = _ZERO_INT = None
+
+# Makes sure the DLL is only added to the CLR once when threads race on first use
+_load_lock = threading.Lock()
+
+
+def _load_api():
+    """
+    Returns the Api class defined in the DLL, loading it on first use
+
+    Reading the registry and starting the CLR is slow and only works on Windows
+    with Visma installed, so it's deferred until the API is actually needed
+    """
+    if _API is None:
+        with _load_lock:
+            if _API is None:
+                _init_api()
+    return _API
+
+
+def _init_api():
+    """
+    Loads the DLL and binds the Api class and the constants used by this module
+    """
+    global _API, Boolean, DateTime, Double, Int32, String
+    global _E_CHAR, _E_DOUBLE, _E_BOOL, _E_DATE, _E_UNUSED
+    global _ADKE_OK, _ERR_ELRC, _DB_FIELDS, _FIELD_NAMES
+    global _EMPTY_STR, _ZERO_D, _FALSE, _ZERO_DATE, _ZERO_INT
+
+    from winreg import HKEY_LOCAL_MACHINE, OpenKey, QueryValueEx
+
+    if IS_64_BIT:
+        from pythonnet import load
+        load("coreclr")
+
+    import clr
+    from System import Boolean, DateTime, Double, String, Int32
+
+    with OpenKey(HKEY_LOCAL_MACHINE, REG_PATH) as key:
+        dll_location = QueryValueEx(key, "AdkDll")[0]
+
+    dll_name = DLL_NAME_64_BIT if IS_64_BIT else DLL_NAME_32_BIT
+    clr.AddReference(os.path.join(dll_location, dll_name))
+
+    if IS_64_BIT:
+        from AdkNetWrapper import Api
+    else:
+        from AdkNet4Wrapper import Api
+
+    # Field types are kept as ints, comparing and hashing those is cheaper
+    # than going through the CLR enum. eUnused is passed to the DLL as is
+    _E_CHAR = int(Api.ADK_FIELD_TYPE.eChar)
+    _E_DOUBLE = int(Api.ADK_FIELD_TYPE.eDouble)
+    _E_BOOL = int(Api.ADK_FIELD_TYPE.eBool)
+    _E_DATE = int(Api.ADK_FIELD_TYPE.eDate)
+    _E_UNUSED = Api.ADK_FIELD_TYPE.eUnused
+
+    _ADKE_OK = Api.ADKE_OK
+    _ERR_ELRC = Api.ADK_ERROR_TEXT_TYPE.elRc
+
+    # Api.__dict__ is large, so both name tables are built in a single pass
+    db_fields = []
+    field_names = []
+    for name in Api.__dict__:
+        if name.startswith("ADK_"):
+            field_names.append(name)
+            if name.startswith("ADK_DB_"):
+                db_fields.append(name)
+    _DB_FIELDS = tuple(db_fields)
+    _FIELD_NAMES = frozenset(field_names)
+
+    _TYPE_TO_PYTYPE.update({
+        _E_CHAR: str,
+        _E_DOUBLE: (float, int, Decimal),
+        _E_BOOL: bool,
+        _E_DATE: datetime.datetime,
+    })
+
+    if hasattr(Api, "AdkGetDouble"):
+        get_double = _get_double
+    elif hasattr(Api, "AdkGetNumeric"):
+        get_double = _get_numeric
+    else:
+        get_double = _get_double_unavailable
+
+    _ACCESSORS.update({
+        _E_CHAR: (_get_str, _set_str),
+        _E_DOUBLE: (get_double, _set_double),
+        _E_BOOL: (_get_bool, _set_bool),
+        _E_DATE: (_get_date, _set_date),
+    })
+
+    _EMPTY_STR = String("")
+    _ZERO_D = Double(0.0)
+    _FALSE = Boolean(0)
+    _ZERO_DATE = DateTime(0)
+    _ZERO_INT = Int32(0)
+
+    _API = Api
+
+
+def __getattr__(name):
+    # Keeps the names this module exposed before the DLL load was deferred
+    # available, without loading the DLL on import
+    if name == "Api":
+        return _load_api()
+    if name in ("Boolean", "DateTime", "Double", "Int32", "String"):
+        _load_api()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-if IS_64_BIT:
-    from AdkNetWrapper import Api
-else:
-    from AdkNet4Wrapper import Api
 
 class Visma:
     """
@@ -59,18 +173,61 @@ class Visma:
             supplier = api.supplier.get(adk_supplier_name="supplier name")
     """
 
+    # The company sessions are held on, and the company actually opened in the DLL.
+    # They differ after a switch until the new company is first used
     _active_company = None
+    _opened_company = None
+    # Guards the companies above and active_sessions, and is notified when
+    # active_sessions drops to zero or _active_company changes. Reentrant
+    # since opening a company through Visma.api happens while it's held
+    _sessions_cv = threading.Condition(threading.RLock())
+    # .company is set to the company path while the current thread holds a session
+    _thread_sessions = threading.local()
     active_sessions = 0
     companies = {}
+    # Maps company names to the Visma instance yielded by get_company_api()
+    _instances = {}
+    # Built by _get_available_fields() on first use
+    _AVAILABLE_FIELDS = None
+    # Maps available field names to their generated _DBField subclass
+    _db_field_classes = {}
 
     def __init__(self, *args, **kwargs):
         super().__init__()
         self.company = kwargs["company"]
 
-        self.available_fields = {
-            self.field_without_db_prefix(field).lower(): field
-            for field in self.db_fields()
-        }
+    @classmethod
+    def _get_available_fields(cls):
+        """
+        Returns a dict of db field names without prefix, lowercased, to db fields
+
+        The db fields defined in the DLL never change, so this is only built once
+        """
+        if cls._AVAILABLE_FIELDS is None:
+            cls._AVAILABLE_FIELDS = {
+                cls.field_without_db_prefix(field).lower(): field
+                for field in cls.db_fields()
+            }
+        return cls._AVAILABLE_FIELDS
+
+    @property
+    def available_fields(self):
+        return self._get_available_fields()
+
+    @classmethod
+    def _get_db_field_class(cls, name):
+        """
+        Returns the _DBField subclass for an available field name, creating it on first use
+        """
+        try:
+            return cls._db_field_classes[name]
+        except KeyError:
+            pass
+
+        cls._db_field_classes[name] = type(
+            name.title(), (_DBField,), {"DB_NAME": cls._get_available_fields()[name]}
+        )
+        return cls._db_field_classes[name]
 
     @classmethod
     @contextmanager
@@ -82,40 +239,79 @@ class Visma:
         Call Visma.add_company() before using this function,
         If more than one company is configured, it waits for other
         requests on a specific company to finish before yielding the object
+
+        The company is opened in the DLL the first time a db is used, e.g. api.supplier,
+        so wrong credentials or paths raise ConnectionError there rather than here.
+        It's left open when the session ends and only closed when a session uses
+        another company, so a session that never uses a db leaves the previously
+        opened company open
         """
         if name not in cls.companies:
             raise CompanyNotFoundError("Company not found. Consider adding it first.")
 
-        instance = cls(company=cls.companies[name])
+        try:
+            instance = cls._instances[name]
+        except KeyError:
+            instance = cls._instances[name] = cls(company=cls.companies[name])
         company = cls.companies[name]["company_path"]
+
+        # Nested on a company this thread already holds a session on,
+        # the outer session keeps it open so no locking is needed
+        if getattr(cls._thread_sessions, "company", None) == company:
+            yield instance
+            return
+
+        with cls._sessions_cv:
+            ready = cls.wait_for(
+                lambda: cls._active_company == company or cls.no_active_sessions()
+            )
+            if not ready:
+                raise TimeoutError("Took too long to obtain the company API.")
+
+            # The company is opened by Visma.api on first use, which
+            # also closes the previously opened company
+            if cls._active_company != company:
+                cls._active_company = company
+                cls._sessions_cv.notify_all()
+            cls.active_sessions += 1
+
+        cls._thread_sessions.company = company
         try:
-            if cls._active_company == company:
-                cls.active_sessions += 1
-                yield instance
-            else:
-                if cls.wait_for(cls.no_active_sessions):
-                    cls.active_sessions += 1
-
-                    # Close previous company
-                    if cls._active_company:
-                        Api.AdkClose()
-
-                    instance.api  # calling this so it sets new active company
-                    yield instance
-                else:
-                    cls.active_sessions += 1
-                    raise TimeoutError("Took too long to obtain the company API.")
+            yield instance
         finally:
-            cls.active_sessions -= 1
+            cls._thread_sessions.company = None
+            cls._drain_pending_deletes()
+            with cls._sessions_cv:
+                cls.active_sessions -= 1
+                if cls.active_sessions == 0:
+                    cls._sessions_cv.notify_all()
 
     @staticmethod
-    def wait_for(predicate, timeout=60):
-        deadline = time.time() + timeout
-        while time.time() < deadline:
-            if predicate():
-                return True
-            time.sleep(0.1)
-        return False
+    def _drain_pending_deletes():
+        """
+        Frees the structs of _Pdata objects collected since the last call
+        Called at points where no record is being read
+        """
+        if not _pending_deletes:
+            return
+
+        api = _load_api()
+        while True:
+            try:
+                data = _pending_deletes.popleft()
+            except IndexError:
+                return
+            _delete_struct(api, data)
+
+    @classmethod
+    def wait_for(cls, predicate, timeout=60):
+        """
+        Blocks until predicate returns True or timeout seconds have passed
+        predicate is checked again every time the last session is released
+        or another company becomes active
+        """
+        with cls._sessions_cv:
+            return cls._sessions_cv.wait_for(predicate, timeout)
 
     @classmethod
     def no_active_sessions(cls):
@@ -140,6 +336,7 @@ class Visma:
             "username": username,
             "password": password,
         }
+        cls._instances.pop(name, None)
 
     def __getattr__(self, name):
         """
@@ -149,10 +346,8 @@ class Visma:
         Returns:
             A _DBField instance exposing methods for any ADK_DB_FIELD
         """
-        if name in self.available_fields:
-            return type(
-                name.title(), (_DBField,), {"DB_NAME": self.available_fields[name]}
-            )(api=self.api)
+        if name in self._get_available_fields():
+            return self._get_db_field_class(name)(api=self.api)
         else:
             raise InvalidFieldError(f"{name} is not a valid field.")
 
@@ -161,36 +356,47 @@ class Visma:
         """
         Returns the Api object defined in DLL and opens a database connection if needed
         """
-        if self.__class__._active_company == self.company["company_path"]:
-            return Api
-        else:
-            self.__class__._active_company = self.company["company_path"]
-
-        error = Api.AdkOpen2(
-            self.company["common_path"],
-            self.company["company_path"],
-            self.company["username"],
-            self.company["password"],
-        )
-        if error.lRc != Api.ADKE_OK:
-            error_message = self._api.AdkGetErrorText(
-                error, Api.ADK_ERROR_TEXT_TYPE.elRc
+        api = _load_api()
+        cls = self.__class__
+        company_path = self.company["company_path"]
+        if cls._opened_company == company_path:
+            return api
+
+        with self._sessions_cv:
+            if cls._opened_company == company_path:
+                return api
+
+            # Close previous company
+            if cls._opened_company:
+                cls._drain_pending_deletes()
+                api.AdkClose()
+                cls._opened_company = None
+            if cls._active_company != company_path:
+                cls._active_company = company_path
+                cls._sessions_cv.notify_all()
+
+            error = api.AdkOpen2(
+                self.company["common_path"],
+                company_path,
+                self.company["username"],
+                self.company["password"],
             )
-            logging.error(error_message)
-            raise ConnectionError(f"Error connecting to the Visma API: {error_message}")
+            if error.lRc != _ADKE_OK:
+                error_message = api.AdkGetErrorText(error, _ERR_ELRC)
+                logging.error(error_message)
+                raise ConnectionError(f"Error connecting to the Visma API: {error_message}")
+            cls._opened_company = company_path
 
-        return Api
+        return api
 
     @staticmethod
-    def get_login_credentials() -> namedtuple:
+    def get_login_credentials() -> Credentials:
         """
         Finds Visma credentials from visma_username and visma_password environment variables
 
         Returns:
             namedtuple containing username and password
         """
-        Credentials = namedtuple("Credentials", ["username", "password"])
-
         try:
             username = os.environ["visma_username"]
             password = os.environ["visma_password"]
@@ -204,12 +410,13 @@ class Visma:
             )
         return Credentials(username=username, password=password)
 
-    def db_fields(self):
+    @staticmethod
+    def db_fields():
         """
         Returns db fields defined in the DLL and Adk.h
         """
-        fields = [field for field in self.api.__dict__ if field.startswith("ADK_DB")]
-        return fields
+        _load_api()
+        return _DB_FIELDS
 
     @staticmethod
     def field_without_db_prefix(db_field):
@@ -231,6 +438,8 @@ class _DBField:
 
     def __init__(self, api):
         self.api = api
+        # Long sessions would otherwise only free structs when they end
+        Visma._drain_pending_deletes()
         self.pdata = _Pdata(
             api=self.api,
             db_name=self.__class__.DB_NAME,
@@ -248,22 +457,17 @@ class _DBField:
 
         """
         for field, filter_term in kwargs.items():
-            field = field.upper()  # Fields in Visma are all uppercased
+            # Validated and resolved through the field cache, so a field is
+            # only looked up in the DLL the first time it's used on this db
             try:
-                self.api.AdkGetType(
-                    self.pdata.data,
-                    getattr(self.api, field),
-                    self.api.ADK_FIELD_TYPE.eUnused,
-                )
+                field_id = self.pdata.get_field(field)[0]
             except AttributeError:
                 raise InvalidFieldError(
-                    f"{field} is not a valid field of {self.__class__.DB_NAME}"
+                    f"{field.upper()} is not a valid field of {self.__class__.DB_NAME}"
                 )
 
-            error = self.api.AdkSetFilter(
-                self.pdata.data, getattr(self.api, field), filter_term, 0
-            )
-            if error.lRc != self.api.ADKE_OK:
+            error = self.api.AdkSetFilter(self.pdata.data, field_id, filter_term, 0)
+            if error.lRc != _ADKE_OK:
                 raise InvalidFilterError
 
     def new(self):
@@ -281,10 +485,8 @@ class _DBField:
         """
         self.set_filter(**kwargs)
         error = self.api.AdkFirstEx(self.pdata.data, include_rows)
-        if error.lRc != self.api.ADKE_OK:
-            error_message = self.api.AdkGetErrorText(
-                error, self.api.ADK_ERROR_TEXT_TYPE.elRc
-            )
+        if error.lRc != _ADKE_OK:
+            error_message = self.api.AdkGetErrorText(error, _ERR_ELRC)
             raise Exception(error_message)
 
         return self.pdata
@@ -294,17 +496,90 @@ class _DBField:
         Returns multiple objects with a generator
         """
         try:
-            self.get(**kwargs)
+            self.get(include_rows=include_rows, **kwargs)
             yield self.pdata
         except Exception:
             return
 
-        while True:
-            error = self.api.AdkNextEx(self.pdata.data, include_rows).lRc
-            if error != self.api.ADKE_OK:
-                break
+        # Bound once, this loop runs once per record
+        pdata = self.pdata
+        data = pdata.data
+        next_ex = self.api.AdkNextEx
+        ok = _ADKE_OK
+        while next_ex(data, include_rows).lRc == ok:
+            yield pdata
+
+
+# Data handles of collected _Pdata objects, freed by Visma._drain_pending_deletes()
+_pending_deletes = deque()
+
+
+def _defer_delete(data):
+    # Called by the garbage collector, which may run while another record is
+    # being read, so the struct is freed later at a known point instead
+    _pending_deletes.append(data)
+
+
+def _delete_struct(api, data):
+    # Not always a callable for some reason, depending on API version?
+    if callable(api.AdkDeleteStruct):
+        api.AdkDeleteStruct(data)
+
+
+# Field getters and setters, _load_api() maps each field type to a pair in _ACCESSORS
+def _get_str(api, data, field):
+    return api.AdkGetStr(data, field, _EMPTY_STR)[1]
+
+
+def _get_double(api, data, field):
+    return api.AdkGetDouble(data, field, _ZERO_D)[1]
+
+
+def _get_numeric(api, data, field):
+    return api.AdkGetNumeric(data, field, _ZERO_D)[1]
 
-            yield self.pdata
+
+def _get_double_unavailable(api, data, field):
+    raise Exception("Neither AdkGetDouble or AdkGetNumeric is available")
+
+
+def _get_bool(api, data, field):
+    return api.AdkGetBool(data, field, _FALSE)[1]
+
+
+def _get_date(api, data, field):
+    return api.AdkGetDate(data, field, _ZERO_DATE)[1]
+
+
+def _get_unsupported(api, data, field):
+    return None
+
+
+def _set_str(api, data, field, value):
+    return api.AdkSetStr(data, field, String(value))
+
+
+def _set_double(api, data, field, value):
+    return api.AdkSetDouble(data, field, Double(value))
+
+
+def _set_bool(api, data, field, value):
+    return api.AdkSetBool(data, field, Boolean(value))
+
+
+def _to_date(date):
+    """
+    Turn datetime object into a C# datetime object
+    """
+    return DateTime(date.year, date.month, date.day, date.hour, date.minute, date.second)
+
+
+def _set_date(api, data, field, value):
+    return api.AdkSetDate(data, field, _to_date(value))
+
+
+def _set_unsupported(api, data, field, value):
+    return None
 
 
 class _Pdata(object):
@@ -327,6 +602,24 @@ class _Pdata(object):
         hello.save()
     """
 
+    # Fields are only reached through __getattr__/__setattr__, so instances
+    # have no __dict__. __weakref__ is needed by weakref.finalize
+    __slots__ = (
+        "api",
+        "db_name",
+        "data",
+        "is_a_row",
+        "parent_pdata",
+        "row_index",
+        "create_new",
+        "fields",
+        "__weakref__",
+    )
+
+    # Field ids and types never change for a db, so they are shared by every record
+    # Maps db_name to a dict of field name to (field id, field type, getter, setter)
+    _field_cache = {}
+
     def __init__(
         self, *, api, db_name, pdata, create_new=False, parent_pdata=None, is_a_row=False, row_index=None
     ):
@@ -337,115 +630,99 @@ class _Pdata(object):
         object.__setattr__(self, "parent_pdata", parent_pdata)
         object.__setattr__(self, "row_index", row_index)
         object.__setattr__(self, "create_new", create_new)
-
-    def __del__(self):
-        # Not always a callable for some reason, depending on API version?
-        if callable(self.api.AdkDeleteStruct):
-            self.api.AdkDeleteStruct(self.data)
-
+        object.__setattr__(self, "fields", self._field_cache.setdefault(db_name, {}))
+        weakref.finalize(self, _defer_delete, pdata)
 
     def __getattr__(self, key):
         try:
-            _type = self.get_type(key)
-        except AttributeError:
-            raise AttributeError(f"{key} is not a valid field of {self.db_name}")
+            field, _type, getter, setter = self.fields[key]
+        except KeyError:
+            field, _type, getter, setter = self._add_field(key)
 
-        default_arguments = (self.data, getattr(self.api, key.upper()))
-
-        if _type == self.api.ADK_FIELD_TYPE.eChar:
-            return self.api.AdkGetStr(*default_arguments, String(""))[1]
-        elif _type == self.api.ADK_FIELD_TYPE.eDouble:
-            if hasattr(self.api, "AdkGetDouble"):
-                return self.api.AdkGetDouble(*default_arguments, Double(0.0))[1]
-            elif hasattr(self.api, "AdkGetNumeric"):
-                return self.api.AdkGetNumeric(*default_arguments, Double(0.0))[1]
-            else:
-                raise Exception("Neither AdkGetDouble or AdkGetNumeric is available")
-        elif _type == self.api.ADK_FIELD_TYPE.eBool:
-            return self.api.AdkGetBool(*default_arguments, Boolean(0))[1]
-        elif _type == self.api.ADK_FIELD_TYPE.eDate:
-            return self.api.AdkGetDate(*default_arguments, DateTime(0))[1]
+        return getter(self.api, self.data, field)
 
     def __setattr__(self, key, value):
         try:
-            _type = self.get_type(key)
-        except AttributeError:
-            raise AttributeError(f"{key} is not a valid field of {self.db_name}")
+            field, _type, getter, setter = self.fields[key]
+        except KeyError:
+            field, _type, getter, setter = self._add_field(key)
 
-        if not self.assignment_types_are_equal(_type, value):
+        # Fields of unknown types accept nothing, isinstance(value, ()) is False
+        if not isinstance(value, _TYPE_TO_PYTYPE.get(_type, ())):
             raise Exception(f"Trying to assign incorrect type to {key}")
 
-        default_arguments = (self.data, getattr(self.api, key.upper()))
-
-        error = None
-        if _type == self.api.ADK_FIELD_TYPE.eChar:
-            error = self.api.AdkSetStr(*default_arguments, String(f"{value}"))
-        elif _type == self.api.ADK_FIELD_TYPE.eDouble:
-            error = self.api.AdkSetDouble(*default_arguments, Double(value))
-        elif _type == self.api.ADK_FIELD_TYPE.eBool:
-            error = self.api.AdkSetBool(*default_arguments, Boolean(value))
-        elif _type == self.api.ADK_FIELD_TYPE.eDate:
-            error = self.api.AdkSetDate(*default_arguments, self.to_date(value))
-
+        error = setter(self.api, self.data, field, value)
 
         # Error could be inside a tuple ( first element )
         # Example: (<AdkNet4Wrapper.ADKERROR object at 0x06F198C8>, 'e6108840-2')
         if isinstance(error, tuple):
             error = error[0]
-        if error and error.lRc != self.api.ADKE_OK:
-            error_message = self.api.AdkGetErrorText(
-                error, self.api.ADK_ERROR_TEXT_TYPE.elRc
-            )
+        if error and error.lRc != _ADKE_OK:
+            error_message = self.api.AdkGetErrorText(error, _ERR_ELRC)
             raise Exception("field: {}, error: {}".format(key, error_message))
 
-    def assignment_types_are_equal(self, field_type, input_type):
-        """
-        Check if assignment value is of same type as field
-        For example:
-            supplier.adk_supplier_name = "hello"
+    to_date = staticmethod(_to_date)
 
-        adk_supplier_name is a string field and expects a string assignment
+    def get_field(self, key):
         """
-        if field_type == self.api.ADK_FIELD_TYPE.eChar and isinstance(input_type, str):
-            return True
-        elif field_type == self.api.ADK_FIELD_TYPE.eDouble and isinstance(
-            input_type, (float, int, Decimal)
-        ):
-            return True
-        elif field_type == self.api.ADK_FIELD_TYPE.eBool and isinstance(
-            input_type, bool
-        ):
-            return True
-        elif field_type == self.api.ADK_FIELD_TYPE.eDate and isinstance(
-            input_type, datetime.datetime
-        ):
-            return True
+        Returns a (field id, field type, getter, setter) tuple for key
 
-        return False
+        The DLL is only asked the first time a field is used for a db,
+        after that it's served from _Pdata._field_cache
+        """
+        try:
+            return self.fields[key]
+        except KeyError:
+            return self._add_field(key)
 
-    def to_date(self, date):
+    def _add_field(self, key):
         """
-        Turn datetime object into a C# datetime object
+        Asks the DLL for the id and type of key and adds it to _Pdata._field_cache
         """
-        return DateTime(
-            date.year, date.month, date.day, date.hour, date.minute, date.second
-        )
+        name = key.upper()
+        if name not in _FIELD_NAMES:
+            raise AttributeError(f"{key} is not a valid field of {self.db_name}")
+
+        field = getattr(self.api, name)
+        _type = int(self.api.AdkGetType(self.data, field, _E_UNUSED)[1])
+
+        getter, setter = _ACCESSORS.get(_type, (_get_unsupported, _set_unsupported))
+
+        self.fields[key] = (field, _type, getter, setter)
+        return self.fields[key]
 
     def get_type(self, key):
-        type = self.api.AdkGetType(
-            self.data, getattr(self.api, key.upper()), self.api.ADK_FIELD_TYPE.eUnused
-        )
-        return type[1]
+        return self.get_field(key)[1]
+
+    def snapshot(self, fields):
+        """
+        Returns a dict of field name to value for the current record
+
+        Meant for reading several fields of every record in a filter() loop.
+        Example:
+            for supplier in api.supplier.filter(adk_supplier_name="*N*"):
+                values = supplier.snapshot(["adk_supplier_name", "adk_supplier_number"])
+
+        Args:
+            fields: names of the fields to read
+        """
+        get_field = self.get_field
+        api = self.api
+        data = self.data
+
+        values = {}
+        for key in fields:
+            field, _type, getter, setter = get_field(key)
+            values[key] = getter(api, data, field)
+        return values
 
     def save(self):
         if self.create_new:
             error = self.api.AdkAdd(self.data)
         else:
             error = self.api.AdkUpdate(self.data)
-        if error.lRc != self.api.ADKE_OK:
-            error_message = self.api.AdkGetErrorText(
-                error, self.api.ADK_ERROR_TEXT_TYPE.elRc
-            )
+        if error.lRc != _ADKE_OK:
+            error_message = self.api.AdkGetErrorText(error, _ERR_ELRC)
             raise Exception(error_message)
 
     def delete(self):
@@ -457,10 +734,8 @@ class _Pdata(object):
     def create(self):
         warnings.warn("create is deprecated, use save instead", DeprecationWarning, stacklevel=2)
         error = self.api.AdkAdd(self.data)
-        if error.lRc != self.api.ADKE_OK:
-            error_message = self.api.AdkGetErrorText(
-                error, self.api.ADK_ERROR_TEXT_TYPE.elRc
-            )
+        if error.lRc != _ADKE_OK:
+            error_message = self.api.AdkGetErrorText(error, _ERR_ELRC)
             raise Exception(error_message)
 
     def rows(self):
@@ -468,33 +743,38 @@ class _Pdata(object):
         Returns a list of rows which are of type _Pdata
         You may access any fields, do assignments and delete rows like any other _Pdata objects
         """
-        _row_db_id = self.api.AdkGetRowDataId(self.data, Int32(0))[1]
-        _nrows_field_id = self.api.AdkGetNrowsFieldId(self.data, Int32(0))[1]
-        _rows_field_id = self.api.AdkGetRowsFieldId(self.data, Int32(0))[1]
-        if hasattr(self.api, "AdkGetDouble"):
-            nrows = self.api.AdkGetDouble(self.data, _nrows_field_id, Double(0.0))[1]
-        elif hasattr(self.api, "AdkGetNumeric"):
-            nrows = self.api.AdkGetNumeric(self.data, _nrows_field_id, Double(0.0))[1]
-        else:
-            raise Exception("Neither AdkGetDouble or AdkGetNumeric is available")
-        
+        # Every row is fetched before any is returned, so deleting rows
+        # while looping over the list doesn't shift the ones left to fetch
+        return list(self.iter_rows())
+
+    def iter_rows(self):
+        """
+        Yields the rows one at a time, like iterating over rows(),
+        but a row isn't kept once the loop has moved past it
 
-        _existing_rows = []
+        Each row is fetched when the loop reaches it, so use rows()
+        if you are going to delete rows inside the loop
+        """
+        Visma._drain_pending_deletes()
+        api = self.api
+        data = self.data
+        _row_db_id = api.AdkGetRowDataId(data, _ZERO_INT)[1]
+        _nrows_field_id = api.AdkGetNrowsFieldId(data, _ZERO_INT)[1]
+        # The double getter reads with AdkGetDouble or AdkGetNumeric, whichever the DLL has
+        nrows = _ACCESSORS[_E_DOUBLE][0](api, data, _nrows_field_id)
+
+        get_row_data = api.AdkGetRowData
+        zero_int = _ZERO_INT
         for index in range(int(nrows)):
-            data = self.api.AdkGetRowData(self.data, index, Int32(0))[1]
-            _existing_rows.append(
-                _Pdata(
-                    api=self.api,
-                    db_name=_row_db_id,
-                    pdata=data,
-                    parent_pdata=self,
-                    is_a_row=True,
-                    row_index=index + 1,
-                )
+            yield _Pdata(
+                api=api,
+                db_name=_row_db_id,
+                pdata=get_row_data(data, index, zero_int)[1],
+                parent_pdata=self,
+                is_a_row=True,
+                row_index=index + 1,
             )
 
-        return _existing_rows
-
     def create_rows(self, quantity=1):
         """
         Returns a list containg rows of _Pdata type.
@@ -510,28 +790,27 @@ class _Pdata(object):
         if quantity < 1:
             raise ValueError("New row quantity must be 1 or higher.")
 
-        _row_db_id = self.api.AdkGetRowDataId(self.data, Int32(0))[1]
-        _nrows_field_id = self.api.AdkGetNrowsFieldId(self.data, Int32(0))[1]
-        _rows_field_id = self.api.AdkGetRowsFieldId(self.data, Int32(0))[1]
-        if hasattr(self.api, "AdkGetDouble"):
-            nrows = self.api.AdkGetDouble(self.data, _nrows_field_id, Double(0.0))[1]
-        elif hasattr(self.api, "AdkGetNumeric"):
-            nrows = self.api.AdkGetNumeric(self.data, _nrows_field_id, Double(0.0))[1]
-        else:
-            raise Exception("Neither AdkGetDouble or AdkGetNumeric is available")
+        api = self.api
+        data = self.data
+        _row_db_id = api.AdkGetRowDataId(data, _ZERO_INT)[1]
+        _nrows_field_id = api.AdkGetNrowsFieldId(data, _ZERO_INT)[1]
+        _rows_field_id = api.AdkGetRowsFieldId(data, _ZERO_INT)[1]
+        nrows = _ACCESSORS[_E_DOUBLE][0](api, data, _nrows_field_id)
+
+        _rows = api.AdkCreateDataRow(_row_db_id, int(nrows) + quantity)
+        api.AdkSetDouble(data, _nrows_field_id, Double(nrows + quantity))
+        api.AdkSetData(data, _rows_field_id, _rows)
 
-        _rows = self.api.AdkCreateDataRow(_row_db_id, int(nrows) + quantity)
-        self.api.AdkSetDouble(self.data, _nrows_field_id, Double(nrows + quantity))
-        self.api.AdkSetData(self.data, _rows_field_id, _rows)
+        get_data_row = api.AdkGetDataRow
+        first_index = int(nrows)
 
         row_objects = []
-        for index in range(quantity):
-            actual_nrows_index = int(nrows) + index
+        for actual_nrows_index in range(first_index, first_index + quantity):
             row_objects.append(
                 _Pdata(
-                    api=self.api,
+                    api=api,
                     db_name=_row_db_id,
-                    pdata=self.api.AdkGetDataRow(_rows, actual_nrows_index),
+                    pdata=get_data_row(_rows, actual_nrows_index),
                     parent_pdata=self,
                     row_index=actual_nrows_index,
                 )